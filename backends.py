@@ -0,0 +1,331 @@
+"""
+缩放后端模块
+PIL / torch / OpenCV（已安装时）三种实现，自动调优按输入规格选择最快后端并持久化决策表
+"""
+import os
+import json
+import math
+import time
+import platform
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+ENV_AUTOTUNE_FILE = "RESOLUTION_PRESETS_AUTOTUNE_FILE"
+DEFAULT_AUTOTUNE_FILE = Path.home() / ".cache" / "comfyui_resolution_presets" / "autotune.json"
+
+Box = Tuple[int, int, int, int]
+
+
+class ResizeBackend:
+    """缩放后端基类：输入输出均为 [B,H,W,C] 浮点张量"""
+
+    name = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def resize(
+        self,
+        images: torch.Tensor,
+        box: Box,
+        size: Tuple[int, int],
+        algo: str,
+        reducing_gap: Optional[float] = None
+    ) -> torch.Tensor:
+        raise NotImplementedError
+
+
+class PILBackend(ResizeBackend):
+    """
+    PIL后端：RGB按8位处理；4通道按8位 'RGBX' 一次处理（不做alpha预乘，各通道独立重采样）；
+    其余通道数按单通道浮点（'F'模式）逐通道处理
+    """
+
+    name = "pil"
+
+    def resize(self, images, box, size, algo, reducing_gap=None):
+        try:
+            resample = getattr(Image.Resampling, algo.upper())
+        except AttributeError:
+            resample = Image.Resampling.LANCZOS
+
+        arr = images.detach().cpu().float().numpy()
+        frames = []
+        for frame in arr:
+            if frame.shape[-1] in (3, 4):
+                data = (frame.clip(0.0, 1.0) * 255).round().astype(np.uint8)
+                if data.shape[-1] == 3:
+                    img = Image.fromarray(data)
+                else:
+                    # 'RGBA' 模式缩放时会按alpha预乘，'RGBX' 则把第4通道当作普通数据
+                    img = Image.frombytes("RGBX", (data.shape[1], data.shape[0]), data.tobytes())
+                img = img.resize(size, resample=resample, box=box, reducing_gap=reducing_gap)
+                frames.append(np.asarray(img, dtype=np.float32) / 255.0)
+            else:
+                channels = [
+                    np.asarray(Image.fromarray(np.ascontiguousarray(frame[..., c])).resize(
+                        size, resample=resample, box=box, reducing_gap=reducing_gap
+                    ))
+                    for c in range(frame.shape[-1])
+                ]
+                frames.append(np.stack(channels, axis=-1).clip(0.0, 1.0))
+        return torch.from_numpy(np.stack(frames)).to(images.dtype)
+
+
+class TorchBackend(ResizeBackend):
+    """torch后端：整批一次插值；lanczos 以带抗锯齿的 bicubic 近似"""
+
+    name = "torch"
+
+    def resize(self, images, box, size, algo, reducing_gap=None):
+        left, top, right, bottom = box
+        width, height = size
+
+        batch = images[:, top:bottom, left:right, :].permute(0, 3, 1, 2).float()
+        if batch.shape[-2:] == (height, width):
+            return batch.permute(0, 2, 3, 1).to(images.dtype).contiguous()
+
+        # 多级缩小：先整数倍平均池化到目标的 reducing_gap 倍左右
+        if reducing_gap is not None and algo != "nearest":
+            factor = int(min(batch.shape[-1] / (width * reducing_gap), batch.shape[-2] / (height * reducing_gap)))
+            if factor > 1:
+                batch = F.avg_pool2d(batch, kernel_size=factor, stride=factor, ceil_mode=True, count_include_pad=False)
+
+        if algo == "nearest":
+            resized = F.interpolate(batch, size=(height, width), mode="nearest-exact")
+        else:
+            mode = "bilinear" if algo == "bilinear" else "bicubic"
+            resized = F.interpolate(batch, size=(height, width), mode=mode, align_corners=False, antialias=True)
+        return resized.clamp_(0.0, 1.0).permute(0, 2, 3, 1).to(images.dtype).contiguous()
+
+
+class OpenCVBackend(ResizeBackend):
+    """OpenCV后端（可选依赖）"""
+
+    name = "opencv"
+
+    @classmethod
+    def available(cls) -> bool:
+        return cv2 is not None
+
+    def resize(self, images, box, size, algo, reducing_gap=None):
+        left, top, right, bottom = box
+        width, height = size
+
+        arr = images.detach().cpu().float().numpy()[:, top:bottom, left:right, :]
+        src_h, src_w = arr.shape[1:3]
+        downscale = width < src_w and height < src_h
+        if algo == "nearest":
+            interp = getattr(cv2, "INTER_NEAREST_EXACT", cv2.INTER_NEAREST)
+        elif algo == "bilinear":
+            # OpenCV的线性插值缩小时不抗锯齿，改用区域插值
+            interp = cv2.INTER_AREA if downscale else cv2.INTER_LINEAR
+        else:
+            interp = cv2.INTER_LANCZOS4
+
+        # 多级缩小：先整数倍区域插值到目标的 reducing_gap 倍左右
+        factor = 1
+        if algo == "lanczos" and downscale:
+            # LANCZOS4是固定8x8核、缩小时不抗锯齿，先整数倍区域插值使剩余比例小于2，不使用 reducing_gap
+            factor = int(min(src_w / width, src_h / height))
+        elif reducing_gap is not None and downscale and algo != "nearest":
+            factor = int(min(src_w / (width * reducing_gap), src_h / (height * reducing_gap)))
+
+        frames = []
+        for frame in arr:
+            frame = np.ascontiguousarray(frame)
+            if factor > 1:
+                frame = cv2.resize(frame, (src_w // factor, src_h // factor), interpolation=cv2.INTER_AREA)
+            out = cv2.resize(frame, (width, height), interpolation=interp)
+            if out.ndim == 2:
+                out = out[..., None]
+            frames.append(out.clip(0.0, 1.0))
+        return torch.from_numpy(np.stack(frames)).to(images.dtype)
+
+
+BACKENDS: Dict[str, ResizeBackend] = {
+    cls.name: cls() for cls in (PILBackend, TorchBackend, OpenCVBackend) if cls.available()
+}
+
+
+def cpu_signature() -> str:
+    """CPU特征标识（型号 + 核数 + torch线程数 + 是否支持AVX-512）"""
+    model = platform.processor() or platform.machine()
+    avx512 = False
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name") and model in ("", platform.machine()):
+                    model = line.split(":", 1)[1].strip()
+                elif line.startswith("flags"):
+                    avx512 = "avx512f" in line.split()
+                    break
+    except OSError:
+        pass
+    return f"{model}|{platform.machine()}|cpus={os.cpu_count()}|threads={torch.get_num_threads()}|avx512={int(avx512)}"
+
+
+def equivalent_backends(algo: str, reducing_gap: Optional[float] = None) -> List[str]:
+    """
+    与PIL结果等价、可供自动模式选择的后端
+    lanczos 只用PIL：torch 没有lanczos，OpenCV 的 LANCZOS4 缩小时不按比例放宽核；
+    OpenCV的线性插值缩小时为区域插值，与PIL的抗锯齿双线性不同，不参与bilinear
+    """
+    if algo == "nearest":
+        names = ["pil", "torch"]
+        if cv2 is not None and hasattr(cv2, "INTER_NEAREST_EXACT"):
+            names.append("opencv")
+    elif algo == "bilinear":
+        names = ["pil", "torch"]
+    else:
+        names = ["pil"]
+    return [name for name in names if name in BACKENDS]
+
+
+class BackendAutotuner:
+    """按 (尺寸等级, 批次, 算法, 多级缩小, 类型) 首次使用时实测等价后端，决策表保存到磁盘"""
+
+    # 实测用合成输入的批次上限（决策表中更大的批次归入此档）与总像素上限
+    BENCHMARK_MAX_BATCH = 4
+    BENCHMARK_MAX_PIXELS = 2048 * 2048
+
+    def __init__(self, table_path: Optional[str] = None):
+        self.table_path = Path(table_path or os.environ.get(ENV_AUTOTUNE_FILE) or DEFAULT_AUTOTUNE_FILE)
+        self.signature = cpu_signature()
+        self._lock = threading.Lock()
+        self._table: Dict[str, str] = self._load().get(self.signature, {})
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        try:
+            return json.loads(self.table_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        """合并写回（其他进程可能已写入别的条目），写临时文件后原子替换"""
+        try:
+            data = self._load()
+            data.setdefault(self.signature, {}).update(self._table)
+            self.table_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.table_path.with_name(f"{self.table_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.table_path)
+        except OSError:
+            pass
+
+    @classmethod
+    def decision_key(
+        cls,
+        images: torch.Tensor,
+        box: Box,
+        size: Tuple[int, int],
+        algo: str,
+        reducing_gap: Optional[float] = None
+    ) -> str:
+        """尺寸等级取源裁剪区域与目标尺寸中较长边的2的幂；批次按实测批次记录（不超过 BENCHMARK_MAX_BATCH）"""
+        longest = max(box[2] - box[0], box[3] - box[1], *size)
+        size_class = 2 ** math.ceil(math.log2(max(1, longest)))
+        gap = "none" if reducing_gap is None else f"{reducing_gap:g}"
+        dtype = str(images.dtype).replace("torch.", "")
+        batch = min(images.shape[0], cls.BENCHMARK_MAX_BATCH)
+        return f"{size_class}|b{batch}|c{images.shape[-1]}|{algo}|gap={gap}|{dtype}"
+
+    def decisions(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._table)
+
+    def _benchmark(
+        self,
+        candidates: List[str],
+        images: torch.Tensor,
+        box: Box,
+        size: Tuple[int, int],
+        algo: str,
+        reducing_gap: Optional[float]
+    ) -> str:
+        """
+        在合成输入上实测：批次取实际批次（不超过 BENCHMARK_MAX_BATCH），
+        总像素不超过 BENCHMARK_MAX_PIXELS（源和目标按同比例缩小），
+        每个后端先预热一次再取两次计时的较小值
+        """
+        batch = min(images.shape[0], self.BENCHMARK_MAX_BATCH)
+        crop_w, crop_h = box[2] - box[0], box[3] - box[1]
+        scale = min(1.0, math.sqrt(self.BENCHMARK_MAX_PIXELS / (batch * crop_w * crop_h)))
+        bench_w, bench_h = max(1, int(crop_w * scale)), max(1, int(crop_h * scale))
+        bench_size = (max(1, int(size[0] * scale)), max(1, int(size[1] * scale)))
+        sample = torch.rand((batch, bench_h, bench_w, images.shape[-1]), dtype=torch.float32).to(images.dtype)
+        bench_box = (0, 0, bench_w, bench_h)
+
+        best_name, best_time = None, float("inf")
+        for name in candidates:
+            backend = BACKENDS[name]
+            try:
+                backend.resize(sample, bench_box, bench_size, algo, reducing_gap)
+                timings = []
+                for _ in range(2):
+                    start = time.perf_counter()
+                    backend.resize(sample, bench_box, bench_size, algo, reducing_gap)
+                    timings.append(time.perf_counter() - start)
+            except Exception:
+                continue
+            if min(timings) < best_time:
+                best_name, best_time = name, min(timings)
+        return best_name or "pil"
+
+    def resize(
+        self,
+        images: torch.Tensor,
+        box: Box,
+        size: Tuple[int, int],
+        algo: str,
+        reducing_gap: Optional[float] = None
+    ) -> torch.Tensor:
+        """按决策表选择后端；未测过的组合先在等价后端间实测并记录"""
+        candidates = equivalent_backends(algo, reducing_gap)
+        if len(candidates) <= 1:
+            name = candidates[0] if candidates else "pil"
+            return BACKENDS[name].resize(images, box, size, algo, reducing_gap)
+
+        key = self.decision_key(images, box, size, algo, reducing_gap)
+        with self._lock:
+            name = self._table.get(key)
+        if name not in candidates:
+            name = self._benchmark(candidates, images, box, size, algo, reducing_gap)
+            with self._lock:
+                self._table[key] = name
+                self._save()
+        return BACKENDS[name].resize(images, box, size, algo, reducing_gap)
+
+
+AUTOTUNER = BackendAutotuner()
+
+
+def get_backend_names() -> List[str]:
+    """可选后端列表（默认PIL在前，含自动）"""
+    return list(BACKENDS) + ["自动"]
+
+
+def resize_images(
+    images: torch.Tensor,
+    box: Box,
+    size: Tuple[int, int],
+    algo: str,
+    reducing_gap: Optional[float] = None,
+    backend: str = "pil"
+) -> torch.Tensor:
+    """按指定后端缩放；'自动' 在与PIL等价的后端中按调优决策选择"""
+    if backend in BACKENDS:
+        return BACKENDS[backend].resize(images, box, size, algo, reducing_gap)
+    return AUTOTUNER.resize(images, box, size, algo, reducing_gap)
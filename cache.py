@@ -0,0 +1,253 @@
+"""
+缩放结果缓存模块
+按张量内容指纹 + 缩放参数缓存结果，LRU淘汰，可选磁盘溢出层
+"""
+import os
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+# 环境变量配置
+ENV_CACHE_MB = "RESOLUTION_PRESETS_CACHE_MB"
+ENV_CACHE_DIR = "RESOLUTION_PRESETS_CACHE_DIR"
+ENV_CACHE_DISK_MB = "RESOLUTION_PRESETS_CACHE_DISK_MB"
+
+DEFAULT_CACHE_MB = 512
+DEFAULT_CACHE_DISK_MB = 2048
+
+
+def tensor_fingerprint(tensor: torch.Tensor) -> str:
+    """张量内容指纹（形状 + 类型 + 数据摘要）"""
+    t = tensor.detach()
+    if t.device.type != "cpu":
+        t = t.cpu()
+    t = t.contiguous()
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((tuple(t.shape), str(t.dtype))).encode())
+    if t.numel() > 0:
+        # 按字节视图直接摘要，避免额外拷贝
+        h.update(t.reshape(-1).view(torch.uint8).numpy())
+    return h.hexdigest()
+
+
+class ResizeCache:
+    """缩放结果LRU缓存（内存层 + 可选磁盘溢出层）"""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        spill_dir: Optional[str] = None,
+        spill_max_bytes: int = 0
+    ):
+        self.max_bytes = max(0, int(max_bytes))
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_max_bytes = max(0, int(spill_max_bytes)) if spill_dir else 0
+
+        self._memory: "OrderedDict[Hashable, torch.Tensor]" = OrderedDict()
+        self._disk: "OrderedDict[Hashable, Tuple[Path, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "spills": 0}
+
+        if self.spill_dir and self.spill_max_bytes > 0:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ResizeCache":
+        """根据环境变量创建缓存"""
+        max_mb = int(os.environ.get(ENV_CACHE_MB, DEFAULT_CACHE_MB))
+        spill_dir = os.environ.get(ENV_CACHE_DIR) or None
+        disk_mb = int(os.environ.get(ENV_CACHE_DISK_MB, DEFAULT_CACHE_DISK_MB))
+        return cls(max_mb * 1024 * 1024, spill_dir, disk_mb * 1024 * 1024)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _nbytes(tensor: torch.Tensor) -> int:
+        return tensor.numel() * tensor.element_size()
+
+    @staticmethod
+    def _spill_name(key: Hashable) -> str:
+        """溢出文件名（同一键可能被多个线程同时溢出，加随机后缀避免写同一文件）"""
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return f"{digest}.{uuid.uuid4().hex[:8]}.npy"
+
+    def get(self, key: Hashable) -> Optional[torch.Tensor]:
+        """查找缓存，命中时移到LRU末尾；返回副本，下游原地修改不会污染缓存"""
+        with self._lock:
+            tensor = self._memory.get(key)
+            if tensor is not None:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                return tensor.clone()
+
+            entry = self._disk.pop(key, None)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            path, size = entry
+            self._disk_bytes -= size
+
+        # 磁盘读取在锁外进行，避免阻塞其他线程
+        try:
+            tensor = torch.from_numpy(np.load(path))
+        except (OSError, ValueError):
+            tensor = None
+        finally:
+            path.unlink(missing_ok=True)
+
+        with self._lock:
+            if tensor is None:
+                self._stats["misses"] += 1
+                return None
+            # 磁盘命中后提升回内存层
+            self._stats["disk_hits"] += 1
+            evicted = self._insert(key, tensor)
+            result = tensor.clone()
+        self._spill(evicted)
+        return result
+
+    def put(self, key: Hashable, tensor: torch.Tensor) -> None:
+        """写入缓存（保存副本），超出预算时按LRU淘汰"""
+        if not self.enabled:
+            return
+        if self._nbytes(tensor) > self.max_bytes:
+            return
+        tensor = tensor.detach().clone()
+        with self._lock:
+            evicted = self._insert(key, tensor)
+        self._spill(evicted)
+
+    def _insert(self, key: Hashable, tensor: torch.Tensor) -> List[Tuple[Hashable, torch.Tensor]]:
+        """写入内存层（需持有锁），返回按LRU淘汰的条目，由调用方在锁外溢出到磁盘"""
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= self._nbytes(old)
+
+        self._memory[key] = tensor
+        self._memory_bytes += self._nbytes(tensor)
+
+        evicted = []
+        while self._memory_bytes > self.max_bytes and self._memory:
+            old_key, old_tensor = self._memory.popitem(last=False)
+            self._memory_bytes -= self._nbytes(old_tensor)
+            self._stats["evictions"] += 1
+            evicted.append((old_key, old_tensor))
+        return evicted
+
+    def _spill(self, evicted: List[Tuple[Hashable, torch.Tensor]]) -> None:
+        """
+        淘汰项写入磁盘溢出层（.npy，命中时整体读回并提升到内存层）
+        文件写入在锁外进行，写完后再在锁内登记
+        """
+        for key, tensor in evicted:
+            if self.spill_max_bytes <= 0 or self._nbytes(tensor) > self.spill_max_bytes:
+                continue
+            try:
+                arr = tensor.cpu().numpy()
+            except TypeError:
+                # bfloat16等numpy不支持的类型不溢出
+                continue
+
+            path = self.spill_dir / self._spill_name(key)
+            try:
+                np.save(path, arr)
+                size = path.stat().st_size
+            except OSError:
+                path.unlink(missing_ok=True)
+                continue
+
+            stale = []
+            with self._lock:
+                if key in self._memory:
+                    # 写盘期间已被重新写入内存层，溢出文件作废
+                    stale.append(path)
+                else:
+                    old = self._disk.pop(key, None)
+                    if old is not None:
+                        stale.append(old[0])
+                        self._disk_bytes -= old[1]
+                    self._disk[key] = (path, size)
+                    self._disk_bytes += size
+                    self._stats["spills"] += 1
+
+                    while self._disk_bytes > self.spill_max_bytes and self._disk:
+                        _, (old_path, old_size) = self._disk.popitem(last=False)
+                        self._disk_bytes -= old_size
+                        stale.append(old_path)
+
+            for old_path in stale:
+                old_path.unlink(missing_ok=True)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], torch.Tensor]) -> torch.Tensor:
+        """命中直接返回，否则计算并写入缓存"""
+        if not self.enabled:
+            return compute()
+        tensor = self.get(key)
+        if tensor is None:
+            tensor = compute()
+            self.put(key, tensor)
+        return tensor
+
+    def clear(self) -> None:
+        """清空缓存（含磁盘层）"""
+        with self._lock:
+            paths = [path for path, _ in self._disk.values()]
+            self._memory.clear()
+            self._disk.clear()
+            self._memory_bytes = 0
+            self._disk_bytes = 0
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中统计"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hit_rate = (self._stats["hits"] + self._stats["disk_hits"]) / lookups if lookups else 0.0
+            return {
+                **self._stats,
+                "hit_rate": round(hit_rate, 4),
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+class PreviewCache:
+    """预览缩略图LRU缓存（按条目数限制）"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+# 全局缩放结果缓存
+RESIZE_CACHE = ResizeCache.from_env()
+PREVIEW_CACHE = PreviewCache()
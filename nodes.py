@@ -5,9 +5,15 @@
 """
 import torch
 import math
+import json
 from typing import Dict, Any, Tuple
-from .presets import get_size_from_preset, PRESETS, CROP_METHODS, RESIZE_ALGOS
-from .utils import ImageUtils
+from .presets import (
+    get_size_from_preset, get_preset_selection, find_nearest_preset, PRESETS, CROP_METHODS, RESIZE_ALGOS, RESIZE_QUALITY,
+    MASK_RESIZE_ALGOS, LATENT_SCALE, LATENT_RESIZE_ALGOS
+)
+from .utils import ImageUtils, ResizePlan
+from .cache import RESIZE_CACHE, PREVIEW_CACHE, tensor_fingerprint
+from .backends import get_backend_names
 
 class BaseResolutionNode:
     """基础分辨率节点"""
@@ -44,59 +50,239 @@ class ResolutionPresetImage(BaseResolutionNode):
             "optional": {
                 "图像输入": ("IMAGE",),
                 "遮罩输入": ("MASK",),
+                "缩放质量": (list(RESIZE_QUALITY), {"default": "高质量"}),
+                "遮罩算法": (MASK_RESIZE_ALGOS, {"default": "bilinear"}),
+                "缩放后端": (get_backend_names(), {"default": "pil"}),
+                "生成预览": ("BOOLEAN", {"default": True}),
+                "RGBA模式": ("BOOLEAN", {"default": False}),
             }
         }
     
-    RETURN_TYPES = ("IMAGE", "MASK", "INT", "INT")
-    RETURN_NAMES = ("图像输出", "遮罩输出", "宽度", "高度")
+    RETURN_TYPES = ("IMAGE", "MASK", "INT", "INT", "RESIZE_PLAN")
+    RETURN_NAMES = ("图像输出", "遮罩输出", "宽度", "高度", "缩放计划")
     FUNCTION = "process_image"
     CATEGORY = "ResolutionPresets"  # 专业分类名
     
-    def process_image(self, 图像输入=None, 遮罩输入=None, **kwargs):
+    @staticmethod
+    def _resize_key(kind: str, tensor: torch.Tensor, params: Tuple):
+        """缓存键：内容指纹 + 缩放参数；缓存关闭时不计算指纹，返回None"""
+        if not RESIZE_CACHE.enabled:
+            return None
+        return (kind, tensor_fingerprint(tensor), params)
+    
+    @staticmethod
+    def _cached_resize(key, compute) -> torch.Tensor:
+        """按缓存键查找缓存，未命中时执行缩放"""
+        if key is None:
+            return compute()
+        return RESIZE_CACHE.get_or_compute(key, compute)
+    
+    def process_image(self, 图像输入=None, 遮罩输入=None, 缩放质量="高质量", 遮罩算法="bilinear", 缩放后端="pil", 生成预览=True, RGBA模式=False, **kwargs):
         use_edge = kwargs["启用边长缩放"]
         edge_mode = kwargs["缩放基准"]
         target_len = kwargs["缩放长度"]
         crop = kwargs["裁剪方式"]
         algo = kwargs["缩放算法"]
+        gap = RESIZE_QUALITY.get(缩放质量)
+        
+        # 以图像（无图像时以遮罩）为源，只计算一次裁剪/缩放计划
+        if 图像输入 is not None:
+            src_size = ImageUtils.get_tensor_size(图像输入)
+        elif 遮罩输入 is not None:
+            src_size = ImageUtils.get_tensor_size(遮罩输入, is_mask=True)
+        else:
+            src_size = None
         
         if use_edge:
-            if 图像输入 is not None:
-                pil_img = ImageUtils.tensor_to_pil(图像输入)
-                pil_img = ImageUtils.resize_by_edge(pil_img, edge_mode, target_len)
-                图像输出 = ImageUtils.pil_to_tensor(pil_img)
-                out_w, out_h = pil_img.size
-            else:
-                图像输出 = torch.zeros((1, 3, 512, 512), dtype=torch.float32)
-                out_w, out_h = 512, 512
-            
+            algo = "lanczos"
+            w, h = ImageUtils.get_edge_size(*src_size, edge_mode, target_len) if src_size else (512, 512)
+        else:
+            choices = {k: kwargs[k] for k in PRESETS}
+            w, h = get_size_from_preset(choices)
+        
+        box = ImageUtils.compute_crop_box(*src_size, w, h, "直接缩放" if use_edge else crop) if src_size else None
+        
+        # RGBA模式：图像与遮罩（或源图alpha）打包成4通道，一次重采样后再拆分
+        packed = ImageUtils.pack_rgba(图像输入, 遮罩输入) if RGBA模式 and 图像输入 is not None else None
+        image_key = None
+        if packed is not None:
+            image_key = self._resize_key("rgba", packed, (box, w, h, algo, gap, 缩放后端))
+            resized = self._cached_resize(image_key, lambda: (
+                ImageUtils.resize_images(packed, box, (w, h), algo, gap, 缩放后端)
+            ))
+            图像输出, 遮罩输出 = resized[..., :3].contiguous(), resized[..., 3].contiguous()
+        elif 图像输入 is not None:
+            image_key = self._resize_key("image", 图像输入, (box, w, h, algo, gap, 缩放后端))
+            图像输出 = self._cached_resize(image_key, lambda: (
+                ImageUtils.resize_images(ImageUtils.to_bhwc(图像输入)[..., :3], box, (w, h), algo, gap, 缩放后端)
+            ))
+        else:
+            图像输出 = torch.zeros((1, h, w, 3), dtype=torch.float32)
+        
+        if packed is None:
             if 遮罩输入 is not None:
-                pil_msk = ImageUtils.tensor_to_pil(遮罩输入, is_mask=True)
-                pil_msk = ImageUtils.resize_by_edge(pil_msk, edge_mode, target_len)
-                遮罩输出 = ImageUtils.pil_to_tensor(pil_msk, is_mask=True)
+                mask_box = ImageUtils.scale_box(box, src_size, ImageUtils.get_tensor_size(遮罩输入, is_mask=True))
+                mask_key = self._resize_key("mask", 遮罩输入, (mask_box, w, h, 遮罩算法))
+                遮罩输出 = self._cached_resize(mask_key, lambda: (
+                    ImageUtils.resize_mask_batch(遮罩输入, mask_box, (w, h), 遮罩算法)
+                ))
             else:
-                遮罩输出 = torch.zeros((1, 1, out_h, out_w), dtype=torch.float32)
-            
-            return (图像输出, 遮罩输出, out_w, out_h)
+                遮罩输出 = torch.zeros((1, h, w), dtype=torch.float32)
         
-        choices = {k: kwargs[k] for k in PRESETS}
-        w, h = get_size_from_preset(choices)
+        plan = ResizePlan(src_size, box, (w, h), algo) if src_size else None
+        result = (图像输出, 遮罩输出, w, h, plan)
+        if not 生成预览 or 图像输入 is None:
+            return result
         
-        if 图像输入 is not None:
-            pil_img = ImageUtils.tensor_to_pil(图像输入)
-            pil_img = ImageUtils.resize_with_crop(pil_img, w, h, crop, algo)
-            图像输出 = ImageUtils.pil_to_tensor(pil_img)
+        # 预览复用图像缩放的缓存键（输出由输入和参数唯一确定），不再对输出做摘要
+        if image_key is None:
+            preview = ImageUtils.make_preview(图像输出)
+        else:
+            preview = PREVIEW_CACHE.get_or_compute(image_key, lambda: ImageUtils.make_preview(图像输出))
+        return {"ui": {"resolution_preview": [preview]}, "result": result}
+
+class ResolutionResizePlan(BaseResolutionNode):
+    """分辨率预设 - 缩放计划（只记录裁剪区域和目标尺寸，不处理像素，可串联组合）"""
+    
+    @classmethod
+    def INPUT_TYPES(cls) -> Dict[str, Any]:
+        return {
+            "required": {
+                **cls.get_preset_inputs(),
+                "裁剪方式": (CROP_METHODS, {"default": "中心裁剪"}),
+                "缩放算法": (RESIZE_ALGOS, {"default": "lanczos"}),
+                "启用自定义分辨率": ("BOOLEAN", {"default": False}),
+                "宽度": ("INT", {"default": 1024, "min": 64, "max": 8192, "step": 8}),
+                "高度": ("INT", {"default": 1024, "min": 64, "max": 8192, "step": 8}),
+            },
+            "optional": {
+                "上游计划": ("RESIZE_PLAN",),
+                "图像输入": ("IMAGE",),
+            }
+        }
+    
+    RETURN_TYPES = ("RESIZE_PLAN", "INT", "INT", "STRING")
+    RETURN_NAMES = ("缩放计划", "宽度", "高度", "计划信息")
+    FUNCTION = "build_plan"
+    CATEGORY = "ResolutionPresets"
+    
+    def build_plan(self, 上游计划=None, 图像输入=None, **kwargs):
+        if kwargs["启用自定义分辨率"]:
+            w, h = self.validate_resolution(kwargs["宽度"], kwargs["高度"])
+        else:
+            choices = {k: kwargs[k] for k in PRESETS}
+            w, h = get_size_from_preset(choices)
+        
+        if 上游计划 is not None:
+            base = 上游计划
+        elif 图像输入 is not None:
+            base = ResizePlan.identity(*ImageUtils.get_tensor_size(图像输入))
         else:
-            图像输出 = torch.zeros((1, 3, h, w), dtype=torch.float32)
+            raise ValueError("缩放计划需要连接「上游计划」或「图像输入」以确定源尺寸")
+        
+        plan = base.then(w, h, kwargs["裁剪方式"], kwargs["缩放算法"])
+        return (plan, w, h, plan.describe())
+
+class ResolutionPlanApply(BaseResolutionNode):
+    """分辨率预设 - 应用缩放计划（组合后的计划对源图一次重采样）"""
+    
+    @classmethod
+    def INPUT_TYPES(cls) -> Dict[str, Any]:
+        return {
+            "required": {
+                "图像输入": ("IMAGE",),
+                "缩放计划": ("RESIZE_PLAN",),
+            },
+            "optional": {
+                "遮罩输入": ("MASK",),
+                "缩放质量": (list(RESIZE_QUALITY), {"default": "高质量"}),
+                "遮罩算法": (MASK_RESIZE_ALGOS, {"default": "bilinear"}),
+                "缩放后端": (get_backend_names(), {"default": "pil"}),
+            }
+        }
+    
+    RETURN_TYPES = ("IMAGE", "MASK", "INT", "INT")
+    RETURN_NAMES = ("图像输出", "遮罩输出", "宽度", "高度")
+    FUNCTION = "apply_plan"
+    CATEGORY = "ResolutionPresets"
+    
+    def apply_plan(self, 图像输入, 缩放计划, 遮罩输入=None, 缩放质量="高质量", 遮罩算法="bilinear", 缩放后端="pil"):
+        w, h = 缩放计划.size
+        图像输出 = 缩放计划.apply(图像输入, RESIZE_QUALITY.get(缩放质量), 缩放后端)
         
         if 遮罩输入 is not None:
-            pil_msk = ImageUtils.tensor_to_pil(遮罩输入, is_mask=True)
-            pil_msk = ImageUtils.resize_with_crop(pil_msk, w, h, crop, algo)
-            遮罩输出 = ImageUtils.pil_to_tensor(pil_msk, is_mask=True)
+            遮罩输出 = 缩放计划.apply_mask(遮罩输入, 遮罩算法)
         else:
-            遮罩输出 = torch.zeros((1, 1, h, w), dtype=torch.float32)
+            遮罩输出 = torch.zeros((1, h, w), dtype=torch.float32)
         
         return (图像输出, 遮罩输出, w, h)
 
+class ResolutionPresetImageBucketed(BaseResolutionNode):
+    """分辨率预设 - 图像分桶批处理（混合尺寸图像列表按最接近的预设分组）"""
+    
+    INPUT_IS_LIST = True
+    
+    @classmethod
+    def INPUT_TYPES(cls) -> Dict[str, Any]:
+        return {
+            "required": {
+                "图像列表": ("IMAGE",),
+                "模型系列": (list(PRESETS), {"default": "SDXL"}),
+                "裁剪方式": (CROP_METHODS, {"default": "中心裁剪"}),
+                "缩放算法": (RESIZE_ALGOS, {"default": "lanczos"}),
+            },
+            "optional": {
+                "缩放质量": (list(RESIZE_QUALITY), {"default": "高质量"}),
+                "缩放后端": (get_backend_names(), {"default": "pil"}),
+            }
+        }
+    
+    RETURN_TYPES = ("IMAGE", "INT", "INT", "STRING")
+    RETURN_NAMES = ("分桶图像", "宽度", "高度", "索引映射")
+    OUTPUT_IS_LIST = (True, True, True, False)
+    FUNCTION = "process_buckets"
+    CATEGORY = "ResolutionPresets"
+    
+    def process_buckets(self, 图像列表, **kwargs):
+        family = kwargs["模型系列"][0]
+        crop = kwargs["裁剪方式"][0]
+        algo = kwargs["缩放算法"][0]
+        gap = RESIZE_QUALITY.get(kwargs.get("缩放质量", ["高质量"])[0])
+        backend = kwargs.get("缩放后端", ["pil"])[0]
+        
+        # 展开为单帧，按最接近的预设分桶
+        frames = [frame for images in 图像列表 for frame in images]
+        buckets: Dict[str, list] = {}
+        sizes: Dict[str, Tuple[int, int]] = {}
+        for idx, frame in enumerate(frames):
+            name, size = find_nearest_preset(frame.shape[1], frame.shape[0], family)
+            buckets.setdefault(name, []).append(idx)
+            sizes[name] = size
+        
+        outputs, widths, heights = [], [], []
+        index_map = [None] * len(frames)
+        for bucket_idx, (name, members) in enumerate(buckets.items()):
+            w, h = sizes[name]
+            
+            # 同一源尺寸的帧合并为一次批量缩放
+            groups: Dict[Tuple[int, int], list] = {}
+            for idx in members:
+                groups.setdefault(tuple(frames[idx].shape[:2]), []).append(idx)
+            
+            resized = {}
+            for (src_h, src_w), group in groups.items():
+                box = ImageUtils.compute_crop_box(src_w, src_h, w, h, crop)
+                batch = ImageUtils.resize_images(torch.stack([frames[i] for i in group]), box, (w, h), algo, gap, backend)
+                resized.update(zip(group, batch))
+            
+            outputs.append(torch.stack([resized[idx] for idx in members]))
+            widths.append(w)
+            heights.append(h)
+            for pos, idx in enumerate(members):
+                index_map[idx] = {"bucket": bucket_idx, "index": pos, "preset": name}
+        
+        return (outputs, widths, heights, json.dumps(index_map, ensure_ascii=False))
+
 class ResolutionPresetLatent(BaseResolutionNode):
     """分辨率预设 - 潜在空间"""
     
@@ -129,6 +315,53 @@ class ResolutionPresetLatent(BaseResolutionNode):
         latent = torch.zeros([1, 4, h // 8, w // 8])
         return ({"samples": latent},)
 
+class ResolutionPresetLatentResize(BaseResolutionNode):
+    """分辨率预设 - 潜在空间缩放（直接处理samples，免去VAE解码/编码）"""
+    
+    @classmethod
+    def INPUT_TYPES(cls) -> Dict[str, Any]:
+        return {
+            "required": {
+                "潜在空间": ("LATENT",),
+                **cls.get_preset_inputs(),
+                "裁剪方式": (CROP_METHODS, {"default": "中心裁剪"}),
+                "缩放算法": (LATENT_RESIZE_ALGOS, {"default": "nearest-exact"}),
+                "保留噪声遮罩": ("BOOLEAN", {"default": True}),
+            }
+        }
+    
+    RETURN_TYPES = ("LATENT", "INT", "INT")
+    RETURN_NAMES = ("潜在空间", "宽度", "高度")
+    FUNCTION = "resize_latent"
+    CATEGORY = "ResolutionPresets"
+    
+    def resize_latent(self, 潜在空间, **kwargs):
+        crop = kwargs["裁剪方式"]
+        algo = kwargs["缩放算法"]
+        keep_mask = kwargs["保留噪声遮罩"]
+        
+        choices = {k: kwargs[k] for k in PRESETS}
+        family, (w, h) = get_preset_selection(choices)
+        scale = LATENT_SCALE.get(family, 8)
+        latent_w, latent_h = max(1, w // scale), max(1, h // scale)
+        
+        samples = 潜在空间["samples"]
+        src_h, src_w = samples.shape[-2:]
+        box = ImageUtils.compute_crop_box(src_w, src_h, latent_w, latent_h, crop)
+        
+        output = 潜在空间.copy()
+        output["samples"] = ImageUtils.resize_latent(samples, box, (latent_w, latent_h), algo)
+        
+        noise_mask = output.pop("noise_mask", None)
+        if keep_mask and noise_mask is not None:
+            # 遮罩可能是像素尺寸，按相对比例套用同一裁剪区域
+            mask_h, mask_w = noise_mask.shape[-2:]
+            mask_box = ImageUtils.scale_box(box, (src_w, src_h), (mask_w, mask_h))
+            mask_size = (max(1, int(round(latent_w * mask_w / src_w))), max(1, int(round(latent_h * mask_h / src_h))))
+            output["noise_mask"] = ImageUtils.resize_latent(noise_mask.float(), mask_box, mask_size, "bilinear")
+        
+        return (output, latent_w * scale, latent_h * scale)
+
 class ResolutionPresetSetter(BaseResolutionNode):
     """分辨率预设器"""
     
@@ -482,7 +715,11 @@ class ResolutionAnalyzer(BaseResolutionNode):
 
 NODE_CLASS_MAPPINGS = {
     "ResolutionPresetImage": ResolutionPresetImage,
+    "ResolutionPresetImageBucketed": ResolutionPresetImageBucketed,
+    "ResolutionResizePlan": ResolutionResizePlan,
+    "ResolutionPlanApply": ResolutionPlanApply,
     "ResolutionPresetLatent": ResolutionPresetLatent,
+    "ResolutionPresetLatentResize": ResolutionPresetLatentResize,
     "ResolutionPresetSetter": ResolutionPresetSetter,
     "ResolutionCalculator": ResolutionCalculator,
     "ResolutionAnalyzer": ResolutionAnalyzer,
@@ -492,7 +729,11 @@ NODE_CLASS_MAPPINGS = {
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "ResolutionPresetImage": "分辨率预设 - 图像",
+    "ResolutionPresetImageBucketed": "分辨率预设 - 图像分桶批处理",
+    "ResolutionResizePlan": "分辨率预设 - 缩放计划",
+    "ResolutionPlanApply": "分辨率预设 - 应用缩放计划",
     "ResolutionPresetLatent": "分辨率预设 - 潜在空间",
+    "ResolutionPresetLatentResize": "分辨率预设 - 潜在空间缩放",
     "ResolutionPresetSetter": "分辨率预设器",
     "ResolutionCalculator": "分辨率计算器",
     "ResolutionAnalyzer": "分辨率分析器",
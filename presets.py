@@ -2,7 +2,8 @@
 分辨率预设配置
 包含完整的FLUX大尺寸支持
 """
-from typing import Dict, List, Tuple
+import math
+from typing import Dict, List, Optional, Tuple
 
 # 按类别组织的预设
 PRESETS: Dict[str, List[Tuple[str, Tuple[int, int]]]] = {
@@ -77,12 +78,44 @@ PRESETS: Dict[str, List[Tuple[str, Tuple[int, int]]]] = {
 
 CROP_METHODS = ["中心裁剪", "直接缩放"]
 RESIZE_ALGOS = ["lanczos", "bilinear", "nearest"]
+MASK_RESIZE_ALGOS = ["bilinear", "area", "nearest"]
 
-def get_size_from_preset(choices: dict) -> Tuple[int, int]:
-    """根据选择的预设获取尺寸"""
+# 缩放质量：大比例缩小时先做整数倍盒式缩小，再做最终重采样
+# 数值为 reducing_gap，None 表示全程使用所选算法
+RESIZE_QUALITY: Dict[str, Optional[float]] = {
+    "高质量": None,
+    "均衡": 3.0,
+    "快速": 2.0,
+}
+
+# 各模型系列VAE的空间下采样倍数
+LATENT_SCALE: Dict[str, int] = {
+    "SD1.5": 8,
+    "SDXL": 8,
+    "FLUX": 8,
+    "WAN": 8,
+    "QWEN": 8,
+}
+LATENT_RESIZE_ALGOS = ["nearest-exact", "bilinear", "area", "bicubic"]
+
+def get_preset_selection(choices: dict) -> Tuple[Optional[str], Tuple[int, int]]:
+    """根据选择的预设获取 (模型系列, 尺寸)，未选择时返回 (None, (512, 512))"""
     for k, v in choices.items():
         if v != "关":
             for name, wh in PRESETS.get(k, []):
                 if name == v:
-                    return wh
-    return (512, 512)
+                    return k, wh
+    return None, (512, 512)
+
+def get_size_from_preset(choices: dict) -> Tuple[int, int]:
+    """根据选择的预设获取尺寸"""
+    return get_preset_selection(choices)[1]
+
+def find_nearest_preset(width: int, height: int, family: str) -> Tuple[str, Tuple[int, int]]:
+    """在指定模型系列中查找长宽比最接近的预设（比例相同时取面积最接近的）"""
+    aspect = math.log(width / height)
+    area = width * height
+    return min(
+        PRESETS[family],
+        key=lambda p: (round(abs(math.log(p[1][0] / p[1][1]) - aspect), 4), abs(p[1][0] * p[1][1] - area))
+    )
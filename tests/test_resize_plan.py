@@ -0,0 +1,106 @@
+"""
+缩放计划测试
+组合后的裁剪区域应与逐级 ImageOps.fit 的结果一致（1像素以内）
+"""
+import sys
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+PIL = pytest.importorskip("PIL")
+from PIL import Image, ImageOps
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_utils():
+    """以包形式加载插件（模块使用相对导入），返回 utils 模块"""
+    if "resolution_presets" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "resolution_presets", ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    return sys.modules["resolution_presets.utils"]
+
+
+utils = load_utils()
+ImageUtils, ResizePlan = utils.ImageUtils, utils.ResizePlan
+
+
+def fit_box(src_size, size):
+    """记录 ImageOps.fit 内部传给 resize 的裁剪区域"""
+    boxes = []
+    original = Image.Image.resize
+
+    def recording_resize(self, *args, **kwargs):
+        boxes.append(kwargs.get("box"))
+        return original(self, *args, **kwargs)
+
+    Image.Image.resize = recording_resize
+    try:
+        ImageOps.fit(Image.new("L", src_size), size)
+    finally:
+        Image.Image.resize = original
+    return boxes[0]
+
+
+def coordinate_image(width, height):
+    """两张 'F' 图分别记录归一化的 x / y 坐标"""
+    xs = np.broadcast_to((np.arange(width, dtype=np.float32) + 0.5) / width, (height, width))
+    ys = np.broadcast_to((np.arange(height, dtype=np.float32)[:, None] + 0.5) / height, (height, width))
+    return np.ascontiguousarray(xs), np.ascontiguousarray(ys)
+
+
+@pytest.mark.parametrize("src_size, size", [
+    ((640, 480), (512, 512)),
+    ((480, 640), (768, 512)),
+    ((1920, 1080), (1024, 1024)),
+    ((1001, 667), (832, 1216)),
+    ((512, 512), (512, 512)),
+])
+def test_compute_crop_box_matches_imageops_fit(src_size, size):
+    box = ImageUtils.compute_crop_box(*src_size, *size, "中心裁剪")
+    expected = fit_box(src_size, size)
+    assert all(abs(a - b) <= 1 for a, b in zip(box, expected))
+
+
+@pytest.mark.parametrize("src_size, first, second", [
+    ((640, 480), (400, 400), (300, 200)),
+    ((1920, 1080), (1024, 1024), (768, 512)),
+    ((720, 1280), (640, 640), (256, 448)),
+])
+def test_composed_center_crops_match_sequential_fit(src_size, first, second):
+    plan = ResizePlan.identity(*src_size).then(*first, "中心裁剪", "bilinear").then(*second, "中心裁剪")
+    assert plan.size == second
+
+    # 逐级 ImageOps.fit 的裁剪区域换算回源图坐标
+    b1 = fit_box(src_size, first)
+    b2 = fit_box(first, second)
+    sx, sy = (b1[2] - b1[0]) / first[0], (b1[3] - b1[1]) / first[1]
+    expected = (b1[0] + b2[0] * sx, b1[1] + b2[1] * sy, b1[0] + b2[2] * sx, b1[1] + b2[3] * sy)
+    assert all(abs(a - b) <= 1 for a, b in zip(plan.box, expected))
+
+    # 像素级：坐标图逐级裁剪缩放 vs 计划一次重采样，内部像素对应的源坐标相差不超过1像素
+    xs, ys = coordinate_image(*src_size)
+    sequential = []
+    for channel in (xs, ys):
+        img = Image.fromarray(channel)
+        img = ImageOps.fit(ImageOps.fit(img, first, Image.Resampling.BILINEAR), second, Image.Resampling.BILINEAR)
+        sequential.append(np.asarray(img))
+    sequential = np.stack(sequential, axis=-1)
+
+    # 单通道走PIL的 'F' 浮点路径，避免8位量化
+    composed = np.stack([
+        plan.apply(torch.from_numpy(channel[None, ..., None]), backend="pil")[0, ..., 0].numpy()
+        for channel in (xs, ys)
+    ], axis=-1)
+
+    inner = (slice(2, -2), slice(2, -2))
+    dx = np.abs(composed[..., 0] - sequential[..., 0])[inner] * src_size[0]
+    dy = np.abs(composed[..., 1] - sequential[..., 1])[inner] * src_size[1]
+    assert dx.max() <= 1.0 and dy.max() <= 1.0
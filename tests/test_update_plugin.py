@@ -0,0 +1,87 @@
+"""
+插件更新脚本测试
+同步会删除目标目录中多余的文件，源文件收集出错时不能清空已安装的插件
+"""
+import shutil
+import subprocess
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+spec = importlib.util.spec_from_file_location("update_plugin", ROOT / "update_plugin.py")
+update_plugin = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(update_plugin)
+
+PLUGIN_FILES = {
+    "__init__.py": "from .nodes import *\n",
+    "nodes.py": "NODE_CLASS_MAPPINGS = {}\n",
+    "web/resolution_presets.js": "// js\n",
+}
+
+
+def git(*args, cwd):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def write_files(root, files):
+    for rel, text in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+
+@pytest.fixture
+def comfyui(tmp_path):
+    """ComfyUI仓库：custom_nodes 被忽略，插件源码以未跟踪的解压副本放在其中，另有一个已安装的旧版本"""
+    if shutil.which("git") is None:
+        pytest.skip("需要git")
+    root = tmp_path / "ComfyUI"
+    root.mkdir()
+    git("init", "-q", cwd=root)
+    (root / ".gitignore").write_text("custom_nodes/\n", encoding="utf-8")
+
+    source = root / "custom_nodes" / "source"
+    write_files(source, PLUGIN_FILES)
+    (source / "__pycache__").mkdir()
+    (source / "__pycache__" / "nodes.cpython-311.pyc").write_bytes(b"\0")
+
+    installed = tmp_path / "install" / update_plugin.PLUGIN_DIR_NAME
+    write_files(installed, {**PLUGIN_FILES, "nodes.py": "# old\n", "venv/keep.txt": "keep\n"})
+    return source, installed
+
+
+def test_untracked_copy_in_parent_repo_uses_directory_walk(comfyui):
+    source, _ = comfyui
+    files = update_plugin.collect_source_files(source)
+    assert sorted(files) == sorted(PLUGIN_FILES)
+
+
+def test_git_checkout_uses_ls_files(comfyui):
+    source, _ = comfyui
+    git("init", "-q", cwd=source)
+    git("add", "__init__.py", "nodes.py", cwd=source)
+    files = update_plugin.collect_source_files(source)
+    assert sorted(files) == ["__init__.py", "nodes.py"]
+
+
+def test_sync_from_untracked_copy_keeps_install(comfyui):
+    source, installed = comfyui
+    files = update_plugin.collect_source_files(source)
+    copied, unchanged, removed = update_plugin.sync_plugin(installed, files, update_plugin.compute_digests(files))
+
+    assert (copied, unchanged, removed) == (1, 2, 0)
+    assert (installed / "nodes.py").read_text(encoding="utf-8") == PLUGIN_FILES["nodes.py"]
+    assert (installed / "venv" / "keep.txt").exists()
+
+
+@pytest.mark.parametrize("files", [{}, {"nodes.py": None}])
+def test_sync_refuses_incomplete_source(comfyui, files):
+    source, installed = comfyui
+    files = {rel: source / rel for rel in files}
+    with pytest.raises(RuntimeError):
+        update_plugin.sync_plugin(installed, files, update_plugin.compute_digests(files))
+    assert (installed / "__init__.py").exists()
+    assert (installed / "nodes.py").read_text(encoding="utf-8") == "# old\n"
@@ -6,9 +6,23 @@ ComfyUI Resolution Presets 插件更新脚本
 
 import os
 import sys
+import json
 import shutil
+import fnmatch
+import hashlib
+import argparse
 import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+PLUGIN_DIR_NAME = 'ComfyUI_Sizepresets'
+
+# 目标目录中不参与同步、更新时原样保留的目录（如插件自带的虚拟环境）
+PRESERVE_DIRS = {'.venv', 'venv', '.tox', '.nox', '.mypy_cache', '.pytest_cache', '.ruff_cache'}
+
+def plugin_path_for(comfyui_path):
+    """由ComfyUI根目录得到插件安装路径"""
+    return Path(comfyui_path) / 'custom_nodes' / PLUGIN_DIR_NAME
 
 def get_plugin_path():
     """获取插件安装路径"""
@@ -32,43 +46,199 @@ def get_plugin_path():
             custom_nodes_path = Path.cwd() / 'custom_nodes'
             custom_nodes_path.mkdir(exist_ok=True)
     
-    plugin_path = custom_nodes_path / 'ComfyUI_Sizepresets'
+    plugin_path = custom_nodes_path / PLUGIN_DIR_NAME
     return plugin_path
 
-def install_plugin():
-    """安装插件"""
-    plugin_path = get_plugin_path()
+def file_digest(path):
+    """计算文件SHA-256"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_gitignore(root):
+    """读取 .gitignore 规则（不含否定规则）"""
+    path = Path(root) / '.gitignore'
+    if not path.exists():
+        return []
+    lines = path.read_text(encoding='utf-8').splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith(('#', '!'))]
+
+def is_ignored(rel, patterns):
+    """按 .gitignore 规则判断相对路径是否被忽略"""
+    parts = rel.split('/')
+    for pattern in patterns:
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if pattern.startswith('/') or '/' in pattern:
+            # 带斜杠的规则相对根目录匹配（匹配到目录时其下文件一并忽略）
+            pattern = pattern.lstrip('/')
+            prefixes = ['/'.join(parts[:i]) for i in range(1, len(parts) + (0 if dir_only else 1))]
+            if any(fnmatch.fnmatch(prefix, pattern) for prefix in prefixes):
+                return True
+        else:
+            names = parts[:-1] if dir_only else parts
+            if any(fnmatch.fnmatch(name, pattern) for name in names):
+                return True
+    return False
+
+def collect_source_files(root):
+    """
+    收集要发布的插件文件，返回 {相对路径: 绝对路径}
+    插件目录本身是git仓库根目录时以 git ls-files 为准；否则（如ZIP解压，或未跟踪地放在
+    ComfyUI仓库的 custom_nodes 下）遍历目录并按 .gitignore 过滤
+    """
+    root = Path(root)
+    try:
+        # 位于上级仓库中时 ls-files 只列出被上级跟踪的文件（未跟踪时为空），不能使用
+        prefix = subprocess.run(
+            ['git', '-C', str(root), 'rev-parse', '--show-prefix'],
+            capture_output=True, check=True
+        ).stdout.decode('utf-8').strip()
+        if prefix:
+            raise ValueError(f"{root} 不是git仓库根目录")
+        output = subprocess.run(
+            ['git', '-C', str(root), 'ls-files', '-z'],
+            capture_output=True, check=True
+        ).stdout.decode('utf-8')
+        rels = [rel for rel in output.split('\0') if rel]
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        patterns = load_gitignore(root) + ['.git/', '__pycache__/']
+        rels = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                rels.append((Path(dirpath) / name).relative_to(root).as_posix())
+        rels = [rel for rel in rels if not is_ignored(rel, patterns)]
     
-    print(f"📦 安装插件到: {plugin_path}")
+    return {rel: root / rel for rel in rels if (root / rel).is_file()}
+
+def collect_installed_files(root):
+    """收集已安装目录中参与同步的文件（跳过保留目录和 __pycache__）"""
+    root = Path(root)
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in PRESERVE_DIRS and d != '__pycache__']
+        for name in filenames:
+            path = Path(dirpath) / name
+            files[path.relative_to(root).as_posix()] = path
+    return files
+
+def compute_digests(files):
+    """批量计算文件摘要"""
+    return {rel: file_digest(path) for rel, path in files.items()}
+
+def sync_plugin(plugin_path, source_files, source_digests):
+    """
+    增量同步到目标目录
+    未变化的文件硬链接进暂存目录，仅复制变化的文件，保留目录原样移入，最后替换目录
+    旧版本保留为 .backup；目标是git仓库时拒绝同步
+    返回 (复制数, 未变化数, 删除数)
+    """
+    plugin_path = Path(plugin_path)
+    if (plugin_path / '.git').exists():
+        raise RuntimeError(f"{plugin_path} 是git仓库，请使用 git pull 更新")
+    if '__init__.py' not in source_files:
+        # 源文件为空或不完整时同步会删除已安装的全部文件
+        raise RuntimeError(f"源文件列表不完整（{len(source_files)} 个文件，缺少 __init__.py），已取消同步")
+    
+    installed_files = collect_installed_files(plugin_path) if plugin_path.exists() else {}
+    installed_digests = compute_digests(installed_files)
     
-    # 如果已存在，备份旧版本
+    changed = [rel for rel, digest in source_digests.items() if installed_digests.get(rel) != digest]
+    removed = [rel for rel in installed_digests if rel not in source_digests]
+    unchanged = len(source_digests) - len(changed)
+    
+    if not changed and not removed:
+        return 0, unchanged, 0
+    
+    # 在暂存目录中组装新版本
+    staging_path = plugin_path.with_name(plugin_path.name + '.staging')
+    if staging_path.exists():
+        shutil.rmtree(staging_path)
+    staging_path.mkdir(parents=True)
+    
+    changed_set = set(changed)
+    for rel, src in source_files.items():
+        dst = staging_path / rel
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if rel in changed_set:
+            shutil.copy2(src, dst)
+        else:
+            try:
+                os.link(installed_files[rel], dst)
+            except OSError:
+                shutil.copy2(installed_files[rel], dst)
+    
+    # 替换目录：旧目录改名为 .backup，再把暂存目录改名到位
+    # 两次改名之间有极短的窗口插件目录不存在，更新期间不要启动ComfyUI
     if plugin_path.exists():
-        backup_path = plugin_path.with_suffix('.backup')
+        for name in PRESERVE_DIRS:
+            if (plugin_path / name).is_dir():
+                os.replace(plugin_path / name, staging_path / name)
+        
+        backup_path = plugin_path.with_name(plugin_path.name + '.backup')
         if backup_path.exists():
             shutil.rmtree(backup_path)
-        shutil.move(plugin_path, backup_path)
-        print(f"📋 已备份旧版本到: {backup_path}")
+        os.replace(plugin_path, backup_path)
+    os.replace(staging_path, plugin_path)
+    
+    return len(changed), unchanged, len(removed)
+
+def install_plugin(plugin_path=None, source_files=None, source_digests=None):
+    """安装插件（增量同步）"""
+    plugin_path = Path(plugin_path) if plugin_path else get_plugin_path()
+    plugin_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # 创建插件目录
-    plugin_path.mkdir(exist_ok=True)
+    if source_files is None:
+        source_files = collect_source_files(Path(__file__).parent)
+        source_digests = compute_digests(source_files)
     
-    # 获取当前脚本所在目录的文件
-    current_dir = Path(__file__).parent
-    plugin_files = ['__init__.py', 'nodes.py', 'presets.py', 'utils.py', 'README.md', 'LICENSE']
+    print(f"📦 安装插件到: {plugin_path}")
     
-    # 复制文件
-    for file in plugin_files:
-        src = current_dir / file
-        dst = plugin_path / file
-        if src.exists():
-            shutil.copy2(src, dst)
-            print(f"✅ 复制: {file}")
+    copied, unchanged, removed = sync_plugin(plugin_path, source_files, source_digests)
+    if copied or removed:
+        print(f"✅ 复制: {copied} 个文件, 未变化: {unchanged} 个, 删除: {removed} 个")
+        print(f"📋 旧版本保留在: {plugin_path.with_name(plugin_path.name + '.backup')}")
+    else:
+        print(f"✅ 已是最新版本 ({unchanged} 个文件未变化)")
     
     print("\n✨ 安装完成！")
     print("重启ComfyUI后，在节点菜单中找到 'ResolutionPresets' 分类。")
     
     return plugin_path
 
+def load_manifest(manifest_path):
+    """读取部署清单：JSON列表，或每行一个ComfyUI路径（#开头为注释）"""
+    text = Path(manifest_path).read_text(encoding='utf-8')
+    if manifest_path.endswith('.json'):
+        return [str(p) for p in json.loads(text)]
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith('#')]
+
+def deploy_fleet(comfyui_paths, jobs=8):
+    """并行同步到多个ComfyUI安装，返回失败数"""
+    source_files = collect_source_files(Path(__file__).parent)
+    source_digests = compute_digests(source_files)
+    
+    print(f"🚀 部署到 {len(comfyui_paths)} 个ComfyUI安装 (并行: {jobs})")
+    
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {
+            executor.submit(sync_plugin, plugin_path_for(p), source_files, source_digests): p
+            for p in comfyui_paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                copied, unchanged, removed = future.result()
+                print(f"✅ {path}: 复制 {copied}, 未变化 {unchanged}, 删除 {removed}")
+            except Exception as e:
+                failures += 1
+                print(f"❌ {path}: {e}")
+    
+    return failures
+
 def check_dependencies():
     """检查依赖"""
     print("🔍 检查依赖...")
@@ -90,10 +260,27 @@ def check_dependencies():
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="ComfyUI Resolution Presets 插件安装器")
+    parser.add_argument('--manifest', help="部署清单文件，列出多个ComfyUI根目录")
+    parser.add_argument('--jobs', type=int, default=8, help="并行部署数")
+    args = parser.parse_args()
+    
     print("=" * 50)
     print("ComfyUI Resolution Presets 插件安装器")
     print("=" * 50)
     
+    if args.manifest:
+        try:
+            failures = deploy_fleet(load_manifest(args.manifest), args.jobs)
+        except Exception as e:
+            print(f"❌ 部署失败: {e}")
+            sys.exit(1)
+        if failures:
+            print(f"\n⚠️  {failures} 个安装更新失败")
+            sys.exit(1)
+        print("\n🎉 全部部署成功！请重启各ComfyUI实例。")
+        return
+    
     try:
         plugin_path = install_plugin()
         check_dependencies()
@@ -1,36 +1,18 @@
 """
 图像处理工具模块
 """
+import io
+import math
+import base64
 import torch
 import numpy as np
-from PIL import Image, ImageOps
+from PIL import Image
 from typing import Tuple, Optional, Dict, Any
+from .backends import resize_images
 
 class ImageUtils:
     """图像处理工具类"""
     
-    @staticmethod
-    def tensor_to_pil(tensor: torch.Tensor, is_mask: bool = False) -> Image.Image:
-        """Tensor转PIL图像"""
-        if tensor.dim() == 4:
-            tensor = tensor.squeeze(0)
-        elif tensor.dim() == 2:
-            tensor = tensor.unsqueeze(0)
-        
-        if tensor.max() <= 1.0:
-            tensor = tensor * 255
-        
-        arr = tensor.cpu().numpy().astype(np.uint8)
-        
-        if is_mask:
-            return Image.fromarray(arr.squeeze(), mode='L')
-        else:
-            if arr.shape[0] == 3:
-                arr = arr.transpose(1, 2, 0)
-            elif arr.shape[0] == 1:
-                arr = np.stack([arr.squeeze()] * 3, axis=-1)
-            return Image.fromarray(arr)
-    
     @staticmethod
     def pil_to_tensor(pil_img: Image.Image, is_mask: bool = False) -> torch.Tensor:
         """PIL图像转Tensor"""
@@ -52,33 +34,76 @@ class ImageUtils:
         return tensor
     
     @staticmethod
-    def resize_with_crop(
-        image: Image.Image,
+    def get_tensor_size(tensor: torch.Tensor, is_mask: bool = False) -> Tuple[int, int]:
+        """获取图像/遮罩张量的 (宽, 高)，兼容 [B,H,W,C] 与 [B,C,H,W]"""
+        if is_mask or tensor.dim() == 2:
+            return tensor.shape[-1], tensor.shape[-2]
+        if tensor.shape[-1] in (1, 3, 4):
+            return tensor.shape[-2], tensor.shape[-3]
+        return tensor.shape[-1], tensor.shape[-2]
+    
+    @staticmethod
+    def scale_box(
+        box: Tuple[int, int, int, int],
+        src_size: Tuple[int, int],
+        dst_size: Tuple[int, int]
+    ) -> Tuple[int, int, int, int]:
+        """把裁剪区域从一个分辨率换算到另一个分辨率"""
+        if src_size == dst_size:
+            return box
+        sx, sy = dst_size[0] / src_size[0], dst_size[1] / src_size[1]
+        left, top = int(round(box[0] * sx)), int(round(box[1] * sy))
+        right = max(left + 1, int(round(box[2] * sx)))
+        bottom = max(top + 1, int(round(box[3] * sy)))
+        return (left, top, right, bottom)
+    
+    @staticmethod
+    def compute_crop_box(
+        src_width: int,
+        src_height: int,
         width: int,
         height: int,
-        crop_method: str,
-        algo: str
-    ) -> Image.Image:
-        """带裁剪的缩放"""
-        try:
-            resample_method = getattr(Image.Resampling, algo.upper())
-        except AttributeError:
-            resample_method = Image.Resampling.LANCZOS
-        
-        if crop_method == "中心裁剪":
-            return ImageOps.fit(image, (width, height), method=resample_method)
+        crop_method: str
+    ) -> Tuple[int, int, int, int]:
+        """计算源图裁剪区域 (left, top, right, bottom)，与 ImageOps.fit 居中裁剪一致"""
+        left, top, right, bottom = ImageUtils.compute_crop_region(src_width, src_height, width, height, crop_method)
+        left, top = int(round(left)), int(round(top))
+        right = min(src_width, left + max(1, int(round(right - left))))
+        bottom = min(src_height, top + max(1, int(round(bottom - top))))
+        return (left, top, right, bottom)
+    
+    @staticmethod
+    def compute_crop_region(
+        src_width: int,
+        src_height: int,
+        width: int,
+        height: int,
+        crop_method: str
+    ) -> Tuple[float, float, float, float]:
+        """计算源图裁剪区域的精确值（不取整，供缩放计划组合使用）"""
+        if crop_method != "中心裁剪":
+            return (0.0, 0.0, float(src_width), float(src_height))
+        
+        src_ratio = src_width / src_height
+        dst_ratio = width / height
+        
+        if src_ratio > dst_ratio:
+            crop_w, crop_h = src_height * dst_ratio, src_height
         else:
-            return image.resize((width, height), resample=resample_method)
+            crop_w, crop_h = src_width, src_width / dst_ratio
+        
+        left = (src_width - crop_w) / 2
+        top = (src_height - crop_h) / 2
+        return (left, top, left + crop_w, top + crop_h)
     
     @staticmethod
-    def resize_by_edge(
-        pil_img: Image.Image,
+    def get_edge_size(
+        width: int,
+        height: int,
         edge_mode: str,
         target_length: int
-    ) -> Image.Image:
-        """按边长缩放"""
-        width, height = pil_img.size
-        
+    ) -> Tuple[int, int]:
+        """按边长计算目标尺寸"""
         if edge_mode == "最长边":
             if width >= height:
                 new_width = target_length
@@ -94,7 +119,123 @@ class ImageUtils:
                 new_width = int(width * target_length / height)
                 new_height = target_length
         
-        return pil_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        return new_width, new_height
+    
+    @staticmethod
+    def to_bhwc(tensor: torch.Tensor) -> torch.Tensor:
+        """图像张量统一为ComfyUI的 [B,H,W,C] 布局"""
+        if tensor.dim() == 3:
+            tensor = tensor.unsqueeze(0)
+        if tensor.shape[-1] not in (1, 3, 4) and tensor.shape[1] in (1, 3, 4):
+            tensor = tensor.permute(0, 2, 3, 1)
+        return tensor
+    
+    @staticmethod
+    def pack_rgba(images: torch.Tensor, mask: Optional[torch.Tensor] = None) -> Optional[torch.Tensor]:
+        """
+        图像与遮罩打包为 [B,H,W,4]，供单次重采样使用
+        未提供遮罩时使用源图alpha（与ComfyUI加载图像一致，遮罩 = 1 - alpha）；
+        两者都没有或尺寸不一致时返回 None
+        """
+        images = ImageUtils.to_bhwc(images)
+        if mask is not None:
+            if mask.dim() == 2:
+                mask = mask.unsqueeze(0)
+            elif mask.dim() == 4:
+                mask = mask.reshape(-1, *mask.shape[-2:])
+            if mask.shape[-2:] != images.shape[1:3] or mask.shape[0] not in (1, images.shape[0]):
+                return None
+            alpha = mask.to(images.dtype).expand(images.shape[0], -1, -1)
+        elif images.shape[-1] == 4:
+            alpha = 1.0 - images[..., 3]
+        else:
+            return None
+        return torch.cat([images[..., :3], alpha.unsqueeze(-1)], dim=-1)
+    
+    @staticmethod
+    def resize_images(
+        images: torch.Tensor,
+        box: Tuple[int, int, int, int],
+        size: Tuple[int, int],
+        algo: str,
+        reducing_gap: Optional[float] = None,
+        backend: str = "pil"
+    ) -> torch.Tensor:
+        """图像批量裁剪 + 缩放（[B,H,W,C]），按后端名或自动调优结果选择实现"""
+        return resize_images(ImageUtils.to_bhwc(images), box, size, algo, reducing_gap, backend)
+    
+    @staticmethod
+    def resize_mask_batch(
+        mask: torch.Tensor,
+        box: Tuple[int, int, int, int],
+        size: Tuple[int, int],
+        algo: str = "bilinear"
+    ) -> torch.Tensor:
+        """遮罩批量裁剪 + 缩放，保持浮点精度，输出 [B,H,W]"""
+        if mask.dim() == 2:
+            mask = mask.unsqueeze(0)
+        elif mask.dim() == 4:
+            mask = mask.reshape(-1, *mask.shape[-2:])
+        
+        left, top, right, bottom = box
+        width, height = size
+        
+        cropped = mask[:, top:bottom, left:right].float()
+        if cropped.shape[-2:] == (height, width):
+            return cropped.clone()
+        
+        batch = cropped.unsqueeze(1)
+        if algo == "area":
+            resized = torch.nn.functional.interpolate(batch, size=(height, width), mode="area")
+        elif algo == "nearest":
+            resized = torch.nn.functional.interpolate(batch, size=(height, width), mode="nearest-exact")
+        else:
+            resized = torch.nn.functional.interpolate(
+                batch, size=(height, width), mode="bilinear", align_corners=False, antialias=True
+            )
+        return resized.squeeze(1).clamp_(0.0, 1.0)
+    
+    @staticmethod
+    def resize_latent(
+        samples: torch.Tensor,
+        box: Tuple[int, int, int, int],
+        size: Tuple[int, int],
+        algo: str
+    ) -> torch.Tensor:
+        """潜在空间裁剪 + 缩放，支持 [B,C,H,W] 与视频 [B,C,T,H,W]"""
+        left, top, right, bottom = box
+        width, height = size
+        
+        cropped = samples[..., top:bottom, left:right]
+        if cropped.shape[-2:] == (height, width):
+            return cropped.clone()
+        
+        # 合并前置维度，整批一次插值
+        flat = cropped.reshape(1, -1, *cropped.shape[-2:])
+        resized = torch.nn.functional.interpolate(flat, size=(height, width), mode=algo)
+        return resized.reshape(*cropped.shape[:-2], height, width)
+    
+    @staticmethod
+    def make_preview(images: torch.Tensor, max_size: int = 256) -> Dict[str, Any]:
+        """生成首帧低分辨率预览（整数倍盒式缩小，JPEG base64）"""
+        frame = ImageUtils.to_bhwc(images)[:1, ..., :3].permute(0, 3, 1, 2).float()
+        height, width = frame.shape[-2:]
+        
+        factor = math.ceil(max(height, width) / max_size)
+        if factor > 1:
+            frame = torch.nn.functional.avg_pool2d(frame, kernel_size=factor, stride=factor, ceil_mode=True)
+        
+        arr = (frame[0].permute(1, 2, 0).clamp(0.0, 1.0) * 255).round().byte().cpu().numpy()
+        if arr.shape[-1] == 1:
+            arr = np.repeat(arr, 3, axis=-1)
+        
+        buffer = io.BytesIO()
+        Image.fromarray(arr).save(buffer, format="JPEG", quality=85)
+        return {
+            "image": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii"),
+            "width": width,
+            "height": height,
+        }
     
     @staticmethod
     def calculate_optimal_size(
@@ -191,3 +332,80 @@ class ImageUtils:
             "is_portrait": height > width,
             "is_square": width == height,
         }
+
+
+class ResizePlan:
+    """惰性缩放计划：记录源尺寸、源图上的裁剪区域和目标尺寸，不处理像素，可连续组合后一次重采样"""
+    
+    def __init__(
+        self,
+        src_size: Tuple[int, int],
+        box: Tuple[float, float, float, float],
+        size: Tuple[int, int],
+        algo: str = "lanczos"
+    ):
+        self.src_size = (int(src_size[0]), int(src_size[1]))
+        self.box = tuple(float(v) for v in box)
+        self.size = (int(size[0]), int(size[1]))
+        self.algo = algo
+    
+    @classmethod
+    def identity(cls, width: int, height: int) -> "ResizePlan":
+        """不做任何变换的计划"""
+        return cls((width, height), (0, 0, width, height), (width, height))
+    
+    def then(self, width: int, height: int, crop_method: str, algo: Optional[str] = None) -> "ResizePlan":
+        """在当前输出上追加一次裁剪 + 缩放，合并为源图上的单个裁剪区域（中间结果不取整，只在最终应用时取整一次）"""
+        crop_box = ImageUtils.compute_crop_region(self.size[0], self.size[1], width, height, crop_method)
+        return self.compose(ResizePlan(self.size, crop_box, (width, height), algo or self.algo))
+    
+    def compose(self, other: "ResizePlan") -> "ResizePlan":
+        """组合计划：other 作用于本计划的输出"""
+        left, top, right, bottom = self.box
+        sx = (right - left) / other.src_size[0]
+        sy = (bottom - top) / other.src_size[1]
+        box = (
+            left + other.box[0] * sx,
+            top + other.box[1] * sy,
+            left + other.box[2] * sx,
+            top + other.box[3] * sy,
+        )
+        return ResizePlan(self.src_size, box, other.size, other.algo)
+    
+    def for_source(self, width: int, height: int) -> "ResizePlan":
+        """换算到不同分辨率的同一源图（如对原图高清版本执行）"""
+        if (width, height) == self.src_size:
+            return self
+        sx, sy = width / self.src_size[0], height / self.src_size[1]
+        box = (self.box[0] * sx, self.box[1] * sy, self.box[2] * sx, self.box[3] * sy)
+        return ResizePlan((width, height), box, self.size, self.algo)
+    
+    def pixel_box(self) -> Tuple[int, int, int, int]:
+        """取整后的裁剪区域"""
+        left, top = int(round(self.box[0])), int(round(self.box[1]))
+        right = min(self.src_size[0], max(left + 1, int(round(self.box[2]))))
+        bottom = min(self.src_size[1], max(top + 1, int(round(self.box[3]))))
+        return (left, top, right, bottom)
+    
+    def apply(
+        self,
+        images: torch.Tensor,
+        reducing_gap: Optional[float] = None,
+        backend: str = "pil"
+    ) -> torch.Tensor:
+        """对源图执行一次重采样"""
+        plan = self.for_source(*ImageUtils.get_tensor_size(images))
+        return ImageUtils.resize_images(images, plan.pixel_box(), plan.size, plan.algo, reducing_gap, backend)
+    
+    def apply_mask(self, mask: torch.Tensor, algo: str = "bilinear") -> torch.Tensor:
+        """对源遮罩执行一次重采样"""
+        plan = self.for_source(*ImageUtils.get_tensor_size(mask, is_mask=True))
+        return ImageUtils.resize_mask_batch(mask, plan.pixel_box(), plan.size, algo)
+    
+    def describe(self) -> str:
+        left, top, right, bottom = self.box
+        return (
+            f"📐 源尺寸: {self.src_size[0]} × {self.src_size[1]}\n"
+            f"✂️ 裁剪区域: ({left:.1f}, {top:.1f}) - ({right:.1f}, {bottom:.1f})\n"
+            f"🎯 目标尺寸: {self.size[0]} × {self.size[1]} ({self.algo})"
+        )
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+ComfyUI Resolution Presets 工作流回放性能测试
+无需启动ComfyUI，按保存的工作流执行本插件节点，统计耗时和内存，超出预算时返回非零
+内存为单独一次（不计时）执行期间进程常驻内存（RSS）相对执行前的峰值增量，可统计到torch张量缓冲区
+"""
+
+import os
+import gc
+import sys
+import json
+import ctypes
+import ctypes.util
+import time
+import argparse
+import tempfile
+import threading
+import importlib.util
+import itertools
+import statistics
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_BUDGET = ROOT / 'workflow_examples' / 'perf_budget.json'
+WIDGET_TYPES = ('INT', 'FLOAT', 'BOOLEAN', 'STRING')
+
+def load_plugin():
+    """以包形式加载插件（节点模块使用相对导入）"""
+    spec = importlib.util.spec_from_file_location(
+        'resolution_presets', ROOT / '__init__.py', submodule_search_locations=[str(ROOT)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def parse_size(text):
+    """'1024x768' -> (1024, 768)"""
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+
+def make_synthetic(input_type, width, height, batch):
+    """生成合成输入（IMAGE为[B,H,W,C]，MASK为[B,H,W]）"""
+    import torch
+    gen = torch.Generator().manual_seed(0)
+    if input_type == 'IMAGE':
+        return torch.rand((batch, height, width, 3), generator=gen)
+    if input_type == 'MASK':
+        return torch.rand((batch, height, width), generator=gen)
+    if input_type == 'LATENT':
+        return {'samples': torch.randn((batch, 4, height // 8, width // 8), generator=gen)}
+    return None
+
+def widget_default(spec):
+    """取输入定义的默认值"""
+    input_type = spec[0]
+    options = spec[1] if len(spec) > 1 else {}
+    if 'default' in options:
+        return options['default']
+    if isinstance(input_type, list):
+        return input_type[0] if input_type else None
+    return {'INT': 0, 'FLOAT': 0.0, 'BOOLEAN': False, 'STRING': ''}.get(input_type)
+
+def build_kwargs(node, node_cls, upstream, synthetic, overrides=None):
+    """由工作流节点构造调用参数：固定参数 > 连线输入 > 控件值 > 合成输入 > 默认值"""
+    input_types = node_cls.INPUT_TYPES()
+    specs = {**input_types.get('required', {}), **input_types.get('optional', {})}
+    widget_names = [
+        name for name, spec in specs.items()
+        if isinstance(spec[0], list) or spec[0] in WIDGET_TYPES
+    ]
+
+    # 控件值按位置对应；工作流中记录了控件名时优先使用
+    values = node.get('widgets_values') or []
+    if isinstance(values, dict):
+        widget_values = dict(values)
+    else:
+        saved_names = [i['name'] for i in node.get('inputs', []) if 'widget' in i]
+        names = saved_names if len(saved_names) == len(values) else widget_names
+        widget_values = dict(zip(names, values))
+
+    kwargs = {}
+    for name, spec in specs.items():
+        if name in upstream:
+            kwargs[name] = upstream[name]
+        elif name in widget_values:
+            value = widget_values[name]
+            # 旧工作流中已失效的选项回退到默认值
+            if isinstance(spec[0], list) and value not in spec[0]:
+                value = widget_default(spec)
+            kwargs[name] = value
+        elif spec[0] in ('IMAGE', 'MASK', 'LATENT'):
+            kwargs[name] = synthetic(spec[0])
+        elif name in widget_names:
+            kwargs[name] = widget_default(spec)
+
+    # 固定参数（如缩放后端）覆盖工作流中保存的值，保证测量可复现
+    for name, value in (overrides or {}).items():
+        if name in specs:
+            kwargs[name] = value
+
+    if getattr(node_cls, 'INPUT_IS_LIST', False):
+        kwargs = {k: [v] for k, v in kwargs.items()}
+    return kwargs
+
+def execution_order(nodes):
+    """按工作流保存的执行顺序排序"""
+    return sorted(nodes, key=lambda n: (n.get('order', 0), n['id']))
+
+def current_rss():
+    """当前进程常驻内存（字节）：优先psutil，其次 /proc/self/statm，都不可用时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm', encoding='utf-8') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def max_rss():
+    """进程历史峰值常驻内存（字节），不支持时返回0"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class RSSSampler(threading.Thread):
+    """后台线程定期采样RSS，记录峰值"""
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss() or 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss() or 0)
+
+def release_free_memory():
+    """回收垃圾并把glibc堆中的空闲内存还给系统，否则复用已释放的内存不会增加RSS，测量结果时有时无"""
+    gc.collect()
+    libc_name = ctypes.util.find_library('c')
+    if sys.platform.startswith('linux') and libc_name:
+        try:
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+def measure_peak_mb(func, kwargs):
+    """
+    单独执行一次，返回RSS峰值相对执行前的增量（MB）
+    无法读取当前RSS时退回 ru_maxrss 增量（只能反映创新高的部分）
+    """
+    release_free_memory()
+    baseline = current_rss()
+    if baseline is None:
+        before = max_rss()
+        func(**kwargs)
+        return max(0, max_rss() - before) / (1024 * 1024)
+
+    sampler = RSSSampler()
+    sampler.start()
+    try:
+        func(**kwargs)
+    finally:
+        sampler.stop()
+    return max(0, sampler.peak - baseline) / (1024 * 1024)
+
+def run_node(node_cls, kwargs, repeat):
+    """执行节点，返回 (输出, 耗时中位数ms, RSS峰值增量MB)；计时执行不做内存采样"""
+    instance = node_cls()
+    func = getattr(instance, node_cls.FUNCTION)
+
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(**kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    peak_mb = measure_peak_mb(func, kwargs)
+
+    if isinstance(result, dict):
+        result = result.get('result', ())
+    return result, statistics.median(timings), peak_mb
+
+def replay_workflow(path, mappings, size, batch, repeat, backend):
+    """回放单个工作流，返回每个插件节点的测量结果"""
+    workflow = json.loads(Path(path).read_text(encoding='utf-8'))
+    nodes = workflow.get('nodes', [])
+    links = {link[0]: (link[1], link[2]) for link in workflow.get('links', [])}
+    outputs = {}
+    measurements = []
+
+    def synthetic(input_type):
+        return make_synthetic(input_type, size[0], size[1], batch)
+
+    for node in execution_order(nodes):
+        node_cls = mappings.get(node.get('type'))
+        if node_cls is None:
+            continue
+
+        upstream = {}
+        for node_input in node.get('inputs', []):
+            source = links.get(node_input.get('link'))
+            if source and source[0] in outputs:
+                src_outputs = outputs[source[0]]
+                if source[1] < len(src_outputs):
+                    upstream[node_input['name']] = src_outputs[source[1]]
+
+        kwargs = build_kwargs(node, node_cls, upstream, synthetic, {'缩放后端': backend})
+        key = f"{Path(path).name}:{node['id']}:{node['type']}:{size[0]}x{size[1]}:b{batch}:{backend}"
+        try:
+            result, latency_ms, peak_mb = run_node(node_cls, kwargs, repeat)
+        except Exception as e:
+            measurements.append({'key': key, 'error': f"{type(e).__name__}: {e}"})
+            continue
+
+        outputs[node['id']] = result
+        measurements.append({'key': key, 'latency_ms': round(latency_ms, 3), 'peak_mb': round(peak_mb, 3)})
+
+    return measurements
+
+def check_budget(measurements, budget, tolerance, slack):
+    """
+    对比预算，返回超标项列表
+    上限为 预算 × 容差 + 绝对余量，避免微秒级节点和几页内存的抖动误报
+    """
+    violations = []
+    for m in measurements:
+        limit = budget.get(m['key'])
+        if not limit or 'error' in m:
+            continue
+        for metric in ('latency_ms', 'peak_mb'):
+            if metric in limit and m[metric] > limit[metric] * tolerance + slack[metric]:
+                violations.append(
+                    f"{m['key']} {metric}: {m[metric]} > {limit[metric]} × {tolerance} + {slack[metric]}"
+                )
+    return violations
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="ComfyUI Resolution Presets 工作流回放性能测试")
+    parser.add_argument('workflows', nargs='*', help="工作流JSON文件（默认 workflow_examples/*.json）")
+    parser.add_argument('--sizes', default='1024x1024', help="合成输入尺寸，逗号分隔，如 1024x1024,6144x3456")
+    parser.add_argument('--batches', default='1', help="合成输入批次数，逗号分隔")
+    parser.add_argument('--repeat', type=int, default=3, help="每个节点重复执行次数（取中位数）")
+    parser.add_argument('--budget', default=str(DEFAULT_BUDGET), help="性能预算文件")
+    parser.add_argument('--tolerance', type=float, default=1.2, help="预算容差倍数")
+    parser.add_argument('--latency-slack', type=float, default=1.0, help="耗时绝对余量（ms）")
+    parser.add_argument('--memory-slack', type=float, default=1.0, help="内存绝对余量（MB）")
+    parser.add_argument('--write-budget', action='store_true', help="将本次测量写入预算文件")
+    parser.add_argument('--with-cache', action='store_true', help="保留缩放结果缓存（默认关闭以测量真实耗时）")
+    parser.add_argument('--backend', default='pil', help="固定所有节点的缩放后端（默认 pil）")
+    parser.add_argument('--autotune-file', help="自动调优决策表（默认每次使用新的临时文件，不读写用户的决策表）")
+    args = parser.parse_args()
+
+    if not args.with_cache:
+        os.environ['RESOLUTION_PRESETS_CACHE_MB'] = '0'
+    # 决策表在插件导入时读取，必须在加载插件前固定
+    autotune_dir = None
+    if args.autotune_file:
+        os.environ['RESOLUTION_PRESETS_AUTOTUNE_FILE'] = args.autotune_file
+    else:
+        autotune_dir = tempfile.TemporaryDirectory(prefix='resolution_presets_bench_')
+        os.environ['RESOLUTION_PRESETS_AUTOTUNE_FILE'] = str(Path(autotune_dir.name) / 'autotune.json')
+    plugin = load_plugin()
+
+    backends = sys.modules['resolution_presets.backends'].get_backend_names()
+    if args.backend not in backends:
+        parser.error(f"未知缩放后端 {args.backend}，可选: {', '.join(backends)}")
+
+    workflows = args.workflows or sorted(
+        str(p) for p in (ROOT / 'workflow_examples').glob('*.json') if p != DEFAULT_BUDGET
+    )
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    batches = [int(b) for b in args.batches.split(',')]
+
+    measurements = []
+    for path, size, batch in itertools.product(workflows, sizes, batches):
+        measurements.extend(replay_workflow(
+            path, plugin.NODE_CLASS_MAPPINGS, size, batch, max(1, args.repeat), args.backend
+        ))
+
+    errors = [m for m in measurements if 'error' in m]
+    for m in measurements:
+        if 'error' in m:
+            print(f"❌ {m['key']}: {m['error']}")
+        else:
+            print(f"⏱️  {m['key']}: {m['latency_ms']:.2f} ms, 内存峰值增量 {m['peak_mb']:.2f} MB")
+
+    budget_path = Path(args.budget)
+    if args.write_budget:
+        budget = {m['key']: {'latency_ms': m['latency_ms'], 'peak_mb': m['peak_mb']} for m in measurements if 'error' not in m}
+        budget_path.write_text(json.dumps(budget, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n📋 已写入预算: {budget_path}")
+        sys.exit(1 if errors else 0)
+
+    violations = []
+    if budget_path.exists():
+        budget = json.loads(budget_path.read_text(encoding='utf-8'))
+        slack = {'latency_ms': args.latency_slack, 'peak_mb': args.memory_slack}
+        violations = check_budget(measurements, budget, args.tolerance, slack)
+        for v in violations:
+            print(f"⚠️  超出预算: {v}")
+    else:
+        print(f"\nℹ️  未找到预算文件 {budget_path}，仅输出测量结果（可用 --write-budget 生成）")
+
+    if errors or violations:
+        sys.exit(1)
+    print("\n✅ 全部节点在预算内")
+
+if __name__ == '__main__':
+    main()